@@ -23,7 +23,8 @@ def review_score(review):
 
 def make_user(name, reviews):
     """Return a user data abstraction."""
-    return [name, {review_restaurant_name(r): r for r in reviews}]
+    by_name = {review_restaurant_name(r): r for r in reviews}
+    return [name, by_name, {n: review_score(r) for n, r in by_name.items()}]
 
 def user_name(user):
     """Return the name of the user, which is a string."""
@@ -33,6 +34,10 @@ def user_reviews(user):
     """Return a dictionary from restaurant names to reviews by the user."""
     return user[1]
 
+def user_scores(user):
+    """Return a dictionary from restaurant names to scores given by the user."""
+    return user[2]
+
 ### === +++ USER ABSTRACTION BARRIER +++ === ###
 
 def user_reviewed_restaurants(user, restaurants):
@@ -42,14 +47,12 @@ def user_reviewed_restaurants(user, restaurants):
     user -- a user
     restaurants -- a list of restaurant data abstractions
     """
-    names = list(user_reviews(user))
+    names = set(user_reviews(user))
     return [r for r in restaurants if restaurant_name(r) in names]
 
 def user_score(user, restaurant_name):
     """Return the score given for restaurant_name by user."""
-    reviewed_by_user = user_reviews(user)
-    user_review = reviewed_by_user[restaurant_name]
-    return review_score(user_review)
+    return user_scores(user)[restaurant_name]
 
 
 # Restaurants
@@ -91,11 +94,8 @@ def restaurant_scores(restaurant):
 
 def restaurant_num_scores(restaurant):
     """Return the number of scores for restaurant."""
-    i = 0
-    for score in restaurant_scores(restaurant):
-        i+= 1 
-    return i 
+    return len(restaurant_scores(restaurant))
 
 def restaurant_mean_score(restaurant):
     """Return the average score for restaurant."""
-    return sum(restaurant_scores(restaurant))/ restaurant_num_scores(restaurant)
+    return mean(restaurant_scores(restaurant))
@@ -82,6 +82,16 @@ def load_data(user_dataset, review_dataset, restaurant_dataset):
 USERS, REVIEWS, ALL_RESTAURANTS = load_data('users.json', 'reviews.json', 'restaurants.json')
 CATEGORIES = {c for r in ALL_RESTAURANTS for c in restaurant_categories(r)}
 
+def index_by_category(restaurants):
+    """Return a dictionary from each category to the restaurants in it."""
+    index = collections.defaultdict(list)
+    for restaurant in restaurants:
+        for category in set(restaurant_categories(restaurant)):
+            index[category].append(restaurant)
+    return dict(index)
+
+RESTAURANTS_BY_CATEGORY = index_by_category(ALL_RESTAURANTS)
+
 def load_user_file(user_file):
     with open(os.path.join(USER_DIRECTORY, user_file)) as f:
         return eval(f.read())
@@ -1,7 +1,11 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+
 from abstractions import *
-from data import ALL_RESTAURANTS, CATEGORIES, USER_FILES, load_user_file
+from data import ALL_RESTAURANTS, CATEGORIES, RESTAURANTS_BY_CATEGORY, USER_FILES, load_user_file
 from ucb import main, trace, interact
-from utils import distance, mean, zip, enumerate, sample
+from utils import squared_distance, mean, zip, enumerate, sample, choice, choices
 from visualize import draw_map
 
 ##################################
@@ -16,8 +20,22 @@ def find_closest(location, centroids):
     >>> find_closest([3.0, 4.0], [[0.0, 0.0], [2.0, 3.0], [4.0, 3.0], [5.0, 5.0]])
     [2.0, 3.0]
     """
-    centroid_distances = [(distance(location,centroid), centroid) for centroid in centroids]
-    return min(centroid_distances)[1]
+    return centroids[closest_index(location, centroids)]
+
+
+def closest_index(location, centroids):
+    """Return the index of the centroid in centroids that is closest to
+    location, preferring the earliest index on ties.
+
+    >>> closest_index([3.0, 4.0], [[0.0, 0.0], [2.0, 3.0], [4.0, 3.0], [5.0, 5.0]])
+    1
+    """
+    best_index, best_distance = 0, squared_distance(location, centroids[0])
+    for i in range(1, len(centroids)):
+        d = squared_distance(location, centroids[i])
+        if d < best_distance:
+            best_index, best_distance = i, d
+    return best_index
 
 
 def group_by_first(pairs):
@@ -31,11 +49,10 @@ def group_by_first(pairs):
     >>> group_by_first(example)
     [[2, 3, 2], [2, 1], [4]]
     """
-    keys = []
-    for key, _ in pairs:
-        if key not in keys:
-            keys.append(key)
-    return [[y for x, y in pairs if x == key] for key in keys]
+    groups = {}
+    for key, value in pairs:
+        groups.setdefault(key, []).append(value)
+    return list(groups.values())
 
 
 def group_by_centroid(restaurants, centroids):
@@ -59,13 +76,9 @@ def group_by_centroid(restaurants, centroids):
     >>> [[restaurant_name(r) for r in g] for g in groups]
     [['X'], ['Y', 'Z']] # r1 is closest to c1, r2 and r3 are closer to c2
     """
-    clusters = []
-    for restaurant in restaurants:
-        closest_centroid = find_closest(restaurant_location(restaurant), centroids)
-        centroid = str(closest_centroid)
-        clusters.append([centroid, restaurant])
-    
-    return group_by_first(clusters)
+    pairs = [[closest_index(restaurant_location(r), centroids), r]
+             for r in restaurants]
+    return group_by_first(pairs)
 
 
 def find_centroid(cluster):
@@ -95,17 +108,62 @@ def find_centroid(cluster):
     return [centroid_lat, centroid_lon]
 
 
-def k_means(restaurants, k, max_updates=100):
-    """Use k-means to group restaurants by location into k clusters."""
+def initial_centroids(locations, k):
+    """Return k of the locations to seed k-means, chosen by k-means++: the
+    first uniformly at random, and each later one with probability
+    proportional to its squared distance from the nearest one chosen so far.
+
+    >>> initial_centroids([[0, 0], [0, 0], [0, 0]], 2)
+    [[0, 0], [0, 0]]
+    """
+    centroids = [choice(locations)]
+    nearest = [squared_distance(location, centroids[0]) for location in locations]
+    while len(centroids) < k:
+        if any(nearest):
+            centroid = choices(locations, weights=nearest)[0]
+        else:
+            centroid = choice(locations)
+        centroids.append(centroid)
+        nearest = [min(d, squared_distance(location, centroid))
+                   for d, location in zip(nearest, locations)]
+    return centroids
+
+
+def k_means(restaurants, k, max_updates=100, tolerance=1e-4):
+    """Use k-means to group restaurants by location into k clusters. Stop
+    early once no restaurant changes cluster or no centroid coordinate
+    moves by tolerance or more. A centroid left with no restaurants is
+    moved to the restaurant farthest from its nearest centroid."""
     assert len(restaurants) >= k, 'Not enough restaurants to cluster'
-    previous_centroids = []
-    n = 0
-    centroids = [restaurant_location(r) for r in sample(restaurants, k)]
-    while previous_centroids != centroids and n < max_updates:
-        previous_centroids = centroids
-        clusters = group_by_centroid(restaurants,centroids)
-        centroids = [find_centroid(cluster) for cluster in clusters]
-        n += 1
+    locations = [restaurant_location(r) for r in restaurants]
+    centroids = initial_centroids(locations, k)
+    labels = []
+    for _ in range(max_updates):
+        previous_labels, labels = labels, []
+        distances = []
+        sums = [[0, 0] for _ in centroids]
+        counts = [0 for _ in centroids]
+        for location in locations:
+            label = closest_index(location, centroids)
+            labels.append(label)
+            distances.append(squared_distance(location, centroids[label]))
+            sums[label][0] += location[0]
+            sums[label][1] += location[1]
+            counts[label] += 1
+        if labels == previous_labels:
+            break
+        previous_centroids, centroids = centroids, []
+        for (lat, lon), count in zip(sums, counts):
+            if count:
+                centroids.append([lat / count, lon / count])
+            else:
+                farthest = distances.index(max(distances))
+                distances[farthest] = 0
+                centroids.append(locations[farthest])
+        if all(abs(new - old) < tolerance
+                for centroid, previous in zip(centroids, previous_centroids)
+                for new, old in zip(centroid, previous)):
+            break
     return centroids
 
 def find_predictor(user, restaurants, feature_fn):
@@ -118,26 +176,100 @@ def find_predictor(user, restaurants, feature_fn):
     restaurants -- A sequence of restaurants
     feature_fn -- A function that takes a restaurant and returns a number
     """
-    reviews_by_user = {review_restaurant_name(review): review_score(review)
-                       for review in user_reviews(user).values()}
-
     xs = [feature_fn(r) for r in restaurants]
-    ys = [reviews_by_user[restaurant_name(r)] for r in restaurants]
+    scores = user_scores(user)
+    ys = [scores[restaurant_name(r)] for r in restaurants]
+    b, a, r_squared = least_squares(xs, ys)
+    return linear_predictor(feature_fn, b, a), r_squared
 
-    mean_x = sum(xs) / len(xs)
+
+def least_squares(xs, ys):
+    """Return the slope b, intercept a, and R^2 value of the least-squares
+    line through the points given by xs and ys.
+
+    >>> least_squares([1, 2, 3], [3, 5, 7])
+    (2.0, 1.0, 1.0)
+    """
+    return fit_to_statistics(xs, score_statistics(ys))
+
+
+def score_statistics(ys):
+    """Return the mean of ys, the deviations of ys from that mean, and the
+    sum of squared deviations, which every regression against ys shares.
+
+    >>> score_statistics([3, 5, 7])
+    (5.0, [-2.0, 0.0, 2.0], 8.0)
+    """
     mean_y = sum(ys) / len(ys)
-    s_xx = sum([(xi - mean_x) ** 2 for xi in xs])
-    s_yy = sum([(yi - mean_y) ** 2 for yi in ys])
-    s_xy = sum([(xi - mean_x) * (yi - mean_y) for xi, yi in zip(xs, ys)])
+    dys = [yi - mean_y for yi in ys]
+    s_yy = sum(dy * dy for dy in dys)
+    return mean_y, dys, s_yy
+
+
+def fit_to_statistics(xs, y_statistics):
+    """Return the slope b, intercept a, and R^2 value of the least-squares
+    line through xs and the ys summarized by y_statistics, as returned by
+    score_statistics.
+
+    >>> fit_to_statistics([1, 2, 3], score_statistics([3, 5, 7]))
+    (2.0, 1.0, 1.0)
+    """
+    mean_y, dys, s_yy = y_statistics
+    mean_x = sum(xs) / len(xs)
+    dxs = [xi - mean_x for xi in xs]
+    s_xx = sum(dx * dx for dx in dxs)
+    s_xy = sum(dx * dy for dx, dy in zip(dxs, dys))
 
     b = s_xy / s_xx
-    a = mean_y - b * mean_x 
-    r_squared = (s_xy ** 2) / (s_xx * s_yy) 
+    a = mean_y - b * mean_x
+    r_squared = (s_xy ** 2) / (s_xx * s_yy)
+    return b, a, r_squared
+
 
+def linear_predictor(feature_fn, b, a):
+    """Return a predictor that scores a restaurant as b * feature_fn + a."""
     def predictor(restaurant):
         return b * feature_fn(restaurant) + a
+    return predictor
+
 
-    return predictor, r_squared
+def best_fit(user, restaurants, feature_fns):
+    """Return the slope b, intercept a, and feature function of the
+    least-squares fit with the highest R^2 value for predicting scores by
+    the user.
+
+    Arguments:
+    user -- A user
+    restaurants -- A list of restaurants
+    feature_fns -- A sequence of functions that each takes a restaurant
+    """
+    reviewed = user_reviewed_restaurants(user, restaurants)
+    scores = user_scores(user)
+    ys = [scores[restaurant_name(r)] for r in reviewed]
+    rows = [[function(r) for function in feature_fns] for r in reviewed]
+    columns = zip(*rows)
+    y_statistics = score_statistics(ys)
+    best, best_r_squared = None, float('-inf')
+    for function, xs in zip(feature_fns, columns):
+        b, a, r_squared = fit_to_statistics(xs, y_statistics)
+        if r_squared > best_r_squared:
+            best, best_r_squared = (b, a, function), r_squared
+    return best
+
+
+@lru_cache(maxsize=128)
+def cached_best_fit(scores, feature_fns):
+    """Return best_fit over ALL_RESTAURANTS for a user whose reviews are the
+    (restaurant name, score) pairs in scores. Both arguments are tuples so
+    that fits can be reused across calls for the same reviews.
+
+    The fit is always over ALL_RESTAURANTS, regardless of the restaurants
+    passed to rate_all. feature_fns must be hashable and stable across
+    calls: a caller that builds fresh lambdas each time never hits the
+    cache, so use module-level functions such as those from feature_set.
+    """
+    user = make_user(None, [make_review(name, score) for name, score in scores])
+    return best_fit(user, ALL_RESTAURANTS, feature_fns)
 
 
 def best_predictor(user, restaurants, feature_fns):
@@ -149,14 +281,8 @@ def best_predictor(user, restaurants, feature_fns):
     restaurants -- A list of restaurants
     feature_fns -- A sequence of functions that each takes a restaurant
     """
-    reviewed = user_reviewed_restaurants(user, restaurants)
-    predictors = []
-    for function in feature_fns:
-        predictor, r_squared = find_predictor(user,reviewed, function)
-        predictors.append((predictor, r_squared))
-    highest_r_squared = max(predictors, key = lambda x: x[1])[0]
-
-    return highest_r_squared
+    b, a, feature_fn = best_fit(user, restaurants, feature_fns)
+    return linear_predictor(feature_fn, b, a)
 
 
 def rate_all(user, restaurants, feature_fns):
@@ -168,12 +294,13 @@ def rate_all(user, restaurants, feature_fns):
     restaurants -- A list of restaurants
     feature_fns -- A sequence of feature functions
     """
-    predictor = best_predictor(user, ALL_RESTAURANTS, feature_fns)
-    reviewed = user_reviewed_restaurants(user, restaurants)
+    scores = tuple(sorted(user_scores(user).items()))
+    b, a, feature_fn = cached_best_fit(scores, tuple(feature_fns))
+    names = [restaurant_name(r) for r in restaurants]
+    reviewed_names = set(user_reviews(user))
     rest_dict ={}
-    reviewed_names = [restaurant_name(r) for r in reviewed]
-    for restaurant in restaurants:
-        rest_name = restaurant_name(restaurant)
+    unrated = []
+    for rest_name, restaurant in zip(names, restaurants):
         if rest_name in reviewed_names:
             user_scored = user_score(user, rest_name)
             if isinstance(user_scored, float):
@@ -181,11 +308,28 @@ def rate_all(user, restaurants, feature_fns):
             else:
                 rest_dict[rest_name] = user_scored
         else:
-            predicted = predictor(restaurant)
-            rest_dict[rest_name] = predicted
+            unrated.append([rest_name, restaurant])
+    rest_dict.update({rest_name: b * feature_fn(r) + a for rest_name, r in unrated})
     return rest_dict
 
 
+def rate_all_users(users, restaurants, feature_fns, max_workers=None):
+    """Return a list containing the result of rate_all for each user in
+    users, computed in parallel across worker processes.
+
+    Arguments:
+    users -- A sequence of users
+    restaurants -- A list of restaurants
+    feature_fns -- A sequence of picklable feature functions
+    max_workers -- The number of worker processes (default: one per CPU)
+    """
+    workers = max_workers or os.cpu_count() or 1
+    chunksize = max(1, len(users) // workers)
+    rate = partial(rate_all, restaurants=restaurants, feature_fns=feature_fns)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(rate, users, chunksize=chunksize))
+
+
 def search(query, restaurants):
     """Return each restaurant in restaurants that has query as a category.
 
@@ -193,16 +337,28 @@ def search(query, restaurants):
     query -- A string
     restaurants -- A sequence of restaurants
     """
+    if restaurants is ALL_RESTAURANTS:
+        return list(RESTAURANTS_BY_CATEGORY.get(query, []))
     return [restaurant for restaurant in restaurants if query in restaurant_categories(restaurant)]
 
 
+def restaurant_latitude(restaurant):
+    """Return the latitude of the restaurant."""
+    return restaurant_location(restaurant)[0]
+
+
+def restaurant_longitude(restaurant):
+    """Return the longitude of the restaurant."""
+    return restaurant_location(restaurant)[1]
+
+
 def feature_set():
     """Return a sequence of feature functions."""
     return [restaurant_mean_score,
             restaurant_price,
             restaurant_num_scores,
-            lambda r: restaurant_location(r)[0],
-            lambda r: restaurant_location(r)[1]]
+            restaurant_latitude,
+            restaurant_longitude]
 
 @main
 def main(*args):